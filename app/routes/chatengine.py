@@ -1,18 +1,29 @@
 import os
+import json
+import math
+import time
+import hashlib
 import warnings
 import asyncio
 import logging
+from collections import OrderedDict
+from typing import Final
+import faiss
+import numpy as np
 from services.llm_services import LLMService
 from services.docblob import DocumentEnhancer
 from llama_index.core.storage.chat_store import SimpleChatStore
-from llama_index.core import VectorStoreIndex, Document
-from llama_index.core.memory import SimpleComposableMemory,ChatMemoryBuffer
-from dotenv import load_dotenv
+from llama_index.core import VectorStoreIndex
+from llama_index.core.memory import SimpleComposableMemory,ChatMemoryBuffer,VectorMemory
 from llama_index.core.postprocessor import MetadataReplacementPostProcessor
 from llama_index.core import StorageContext, load_index_from_storage
+from llama_index.core.chat_engine import ContextChatEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+from llama_index.vector_stores.faiss import FaissVectorStore
 from llama_index.core.ingestion import IngestionPipeline
 from llama_index.core.schema import MetadataMode
-from llama_index.core.node_parser import MarkdownNodeParser
+from llama_index.core.node_parser import MarkdownNodeParser, SentenceWindowNodeParser
 from llama_index.core.extractors import (
     SummaryExtractor,
     QuestionsAnsweredExtractor,
@@ -20,11 +31,7 @@ from llama_index.core.extractors import (
 from llama_index.core.indices.query.query_transform.base import (
     HyDEQueryTransform,
 )
-import nest_asyncio
 
-# Apply nest_asyncio for Jupyter and other environments
-nest_asyncio.apply()
- 
 # Suppress cryptography deprecation warnings
 warnings.filterwarnings("ignore", category=UserWarning)
  
@@ -32,81 +39,7 @@ warnings.filterwarnings("ignore", category=UserWarning)
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
  
-class Tools:
-    def __init__(self):
-        logger.debug("Initializing Tools class...")
-        # Load environment variables
-        load_dotenv(override=True)
-        self.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        self.container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
-
-        # Initialize the LLM and embedding model
-        self.llm_initializer = LLMService('config.json')
-        self.llm = self.llm_initializer.get_llm()
-        self.embed_model = self.llm_initializer.get_embed_model()
-
-        # Postprocessor for metadata
-        self.postproc = MetadataReplacementPostProcessor(
-            target_metadata_key="window"
-        )
-
-        # Persistent directory for index storage
-        self.persist_dir = "dbmindexstore"
-        self.chat_store = SimpleChatStore()
-        self.chat_memory = ChatMemoryBuffer.from_defaults(chat_history=[],token_limit=3000,chat_store=self.chat_store,chat_store_key="user1")
-        self.memory=SimpleComposableMemory.from_defaults(primary_memory=self.chat_memory)
-        self.hyde_transformer = HyDEQueryTransform(llm=self.llm, include_original=True)
-        self.index = asyncio.run(self._initialize_index())
-
-    async def _initialize_index(self):
-        try:
-            if os.path.exists(self.persist_dir) and os.listdir(self.persist_dir):
-                logger.info("Loading existing index...")
-                storage_context = StorageContext.from_defaults(persist_dir=self.persist_dir)
-                return load_index_from_storage(storage_context)
-            else:
-                logger.info("Creating a new index from documents...")
-                # local_directory = "docs"  # Replace with your directory containing documents
-                enhancer = DocumentEnhancer(self.connection_string, self.container_name)
-                enhanced_documents = enhancer.load_and_enhance_documents()
-
-                # Load and process documents
-                documents = [Document(text=doc.text, metadata=doc.metadata) for doc in enhanced_documents]
-                logger.debug("Documents loaded and enhanced.")
-
-                node_parser = MarkdownNodeParser()
-                self.nodes = node_parser.get_nodes_from_documents(documents)
-                logger.debug("Nodes parsed from documents.")
-
-                extractors = [
-                    SummaryExtractor(summaries=["prev", "self", "next"], llm=self.llm, num_workers=4),
-                    QuestionsAnsweredExtractor(questions=3, llm=self.llm, metadata_mode=MetadataMode.EMBED, num_workers=4),
-                ]
-
-                # Parallelize pipeline processing
-                pipeline = IngestionPipeline(transformations=[node_parser, *extractors])
-                nodes1 = await pipeline.arun(nodes=self.nodes, in_place=False, show_progress=True)
-
-                # Create and save the index
-                index = VectorStoreIndex(self.nodes + nodes1, use_async=True)
-                logger.info("Index created and nodes ingested.")
-
-                index.storage_context.persist(persist_dir=self.persist_dir)
-                logger.debug("Index persisted to storage.")
-                return index
-        except Exception as e:
-            logger.error(f"Error initializing index: {e}", exc_info=True)
-
-    def query_document_tool(self, query: str):
-        try:
-            logger.debug(f"Received query: {query}")
-            engine=self.index.as_chat_engine(
-            similarity_top_k=4,
-            query_transform=self.hyde_transformer,
-            node_postprocessors=[self.postproc],
-            memory=self.memory,
-            chat_mode="context",
-            system_prompt="""
+SYSTEM_PROMPT: Final[str] = """
             You are an Analysis Assistant tasked with providing fully comprehensive, accurate, and complete answers to all user queries based solely on the provided document. Your answers should leave the user fully satisfied, ensuring no detail is left unaddressed.
 
         1. Understanding the User's Query:
@@ -186,10 +119,484 @@ class Tools:
 #     - Also include horizontal lines to separate sections in your answers if required.
 #     - Give emojis to make it more fun for the user. Do not overuse the emojis.
 #    """
+
+
+class HammingRerankRetriever(BaseRetriever):
+    """Two-stage retriever: a coarse Hamming search over 1-bit packed codes picks
+    top_k * oversample candidates, then only those are reranked with exact fp32
+    dot products. The binary scan runs on popcnt and touches 1/32 of the bytes
+    of a full fp32 pass."""
+
+    def __init__(self, docstore, binary_index, node_ids, embeddings, embed_model,
+                 hyde_fn=None, similarity_top_k=4, oversample=4):
+        super().__init__()
+        self._docstore = docstore
+        self._binary_index = binary_index
+        self._node_ids = node_ids
+        self._embeddings = embeddings
+        self._embed_model = embed_model
+        self._hyde_fn = hyde_fn
+        self._similarity_top_k = similarity_top_k
+        self._oversample = oversample
+
+    def _retrieve(self, query_bundle):
+        if self._hyde_fn is not None:
+            query_bundle = self._hyde_fn(query_bundle.query_str)
+        embedding = query_bundle.embedding
+        if embedding is None:
+            embedding = self._embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
             )
- 
-            response = engine.chat(query)
+        query = np.asarray(embedding, dtype=np.float32)
+        codes = np.packbits(query[None, :] > 0, axis=1)
+        num_candidates = min(
+            self._similarity_top_k * self._oversample, self._binary_index.ntotal
+        )
+        _, candidates = self._binary_index.search(codes, num_candidates)
+        candidates = [int(i) for i in candidates[0] if i >= 0]
+        scores = self._embeddings[candidates].astype(np.float32) @ query
+        order = np.argsort(scores)[::-1][: self._similarity_top_k]
+        return [
+            NodeWithScore(
+                node=self._docstore.get_node(self._node_ids[candidates[i]]),
+                score=float(scores[i]),
+            )
+            for i in order
+        ]
+
+    async def _aretrieve(self, query_bundle):
+        # The HyDE LLM call and query embedding inside _retrieve are blocking
+        # network I/O; run them off the event loop so concurrent achat calls
+        # keep making progress instead of stalling behind one retrieval.
+        return await asyncio.to_thread(self._retrieve, query_bundle)
+
+
+class Tools:
+    HYDE_CACHE_SIZE = 1024
+    EMBED_CHUNK_SIZE = 64
+    BUILD_LOCK_STALE_SECS = 1800
+
+    def __init__(self):
+        logger.debug("Initializing Tools class...")
+        # Environment variables are loaded once at process start (run.py)
+        self.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+        self.container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
+
+        # Initialize the LLM and embedding model
+        self.llm_initializer = LLMService('config.json')
+        self.llm = self.llm_initializer.get_llm()
+        self.embed_model = self.llm_initializer.get_embed_model()
+
+        # Postprocessor for metadata
+        self.postproc = MetadataReplacementPostProcessor(
+            target_metadata_key="window"
+        )
+
+        # Persistent directory for index storage
+        self.persist_dir = "dbmindexstore"
+        self._build_lock_path = f"{self.persist_dir}.lock"
+        self.chat_store = SimpleChatStore()
+        # Keep the verbatim history small; older turns are recalled from the
+        # vector memory instead of re-sent to the LLM every request.
+        self.chat_memory = ChatMemoryBuffer.from_defaults(chat_history=[],token_limit=1024,chat_store=self.chat_store,chat_store_key="user1")
+        self.vector_memory = VectorMemory.from_defaults(
+            vector_store=None,
+            embed_model=self.embed_model,
+            retriever_kwargs={"similarity_top_k": 2},
+        )
+        self.memory=SimpleComposableMemory.from_defaults(
+            primary_memory=self.chat_memory,
+            secondary_memory_sources=[self.vector_memory],
+        )
+        self.hyde_transformer = HyDEQueryTransform(llm=self.llm, include_original=True)
+        self._hyde_cache = OrderedDict()
+        self.binary_index = None
+        self.rerank_node_ids = None
+        self.rerank_embeddings = None
+        self.index = None
+        self.engine = None
+
+    @classmethod
+    async def create(cls) -> "Tools":
+        """Async factory: build the Tools instance on the caller's event loop
+        (FastAPI's lifespan) instead of spinning up a nested loop with
+        asyncio.run."""
+        tools = cls()
+        tools.index = await tools._initialize_index()
+        tools.engine = tools._build_chat_engine()
+        return tools
+
+    def _build_faiss_index(self, embeddings):
+        """Train an IVF index over the ingest embeddings so queries probe a few
+        coarse cells instead of brute-force scanning every fp32 vector.
+
+        The default "ivf_sq8" variant stores INT8 scalar-quantized codes, which
+        lets FAISS use its SIMD INT8 kernels and cuts memory bandwidth 4x vs
+        fp32; set faiss_index_type to "ivf_pq" in config.json for the smaller
+        product-quantized codes instead."""
+        x = np.asarray(embeddings, dtype=np.float32)
+        n, d = x.shape
+        nlist = max(1, min(n, int(math.sqrt(n))))
+        quantizer = faiss.IndexFlatIP(d)
+        index_type = self.llm_initializer.config.get('faiss_index_type', 'ivf_sq8')
+        if index_type == 'ivf_pq':
+            faiss_index = faiss.IndexIVFPQ(quantizer, d, nlist, 32, 8)
+        else:
+            # QT_8bit learns per-dimension min/max during train(); a direct
+            # int8 cast would flatten unit-norm embedding components to zero.
+            faiss_index = faiss.IndexIVFScalarQuantizer(
+                quantizer, d, nlist,
+                faiss.ScalarQuantizer.QT_8bit,
+                faiss.METRIC_INNER_PRODUCT,
+            )
+        faiss_index.train(x)
+        logger.debug(f"FAISS {index_type} index trained on {n} vectors (d={d}, nlist={nlist}).")
+        return faiss_index
+
+    def _build_binary_index(self, node_ids, embeddings):
+        """Build the 1-bit side index used for the coarse Hamming stage, keeping
+        the original embeddings around for the exact rerank."""
+        x = np.asarray(embeddings, dtype=np.float32)
+        codes = np.packbits(x > 0, axis=1)
+        self.binary_index = faiss.IndexBinaryFlat(x.shape[1])
+        self.binary_index.add(codes)
+        self.rerank_node_ids = list(node_ids)
+        # fp16 halves the resident bytes of the rerank matrix; scores are
+        # computed in fp32 at query time
+        self.rerank_embeddings = x.astype(np.float16)
+
+    def _persist_binary_index(self):
+        faiss.write_index_binary(
+            self.binary_index, os.path.join(self.persist_dir, "hamming_index.bin")
+        )
+        np.savez(
+            os.path.join(self.persist_dir, "rerank_store.npz"),
+            node_ids=np.array(self.rerank_node_ids),
+            embeddings=self.rerank_embeddings,
+        )
+
+    def _load_binary_index(self):
+        binary_path = os.path.join(self.persist_dir, "hamming_index.bin")
+        rerank_path = os.path.join(self.persist_dir, "rerank_store.npz")
+        if os.path.exists(binary_path) and os.path.exists(rerank_path):
+            self.binary_index = faiss.read_index_binary(binary_path)
+            rerank_store = np.load(rerank_path)
+            self.rerank_node_ids = [str(i) for i in rerank_store["node_ids"]]
+            self.rerank_embeddings = rerank_store["embeddings"]
+            logger.debug("Binary Hamming index loaded from storage.")
+
+    def _hyde_query_bundle(self, query: str):
+        """Memoize the HyDE hypothetical document and its embedding per
+        normalized query, so repeat queries skip both the LLM round-trip and
+        the re-embedding step."""
+        key = hashlib.blake2b(query.strip().lower().encode()).hexdigest()
+        bundle = self._hyde_cache.get(key)
+        if bundle is not None:
+            self._hyde_cache.move_to_end(key)
+            logger.debug("HyDE cache hit.")
+            return bundle
+        bundle = self.hyde_transformer.run(query)
+        bundle.embedding = self.embed_model.get_agg_embedding_from_queries(
+            bundle.embedding_strs
+        )
+        self._hyde_cache[key] = bundle
+        if len(self._hyde_cache) > self.HYDE_CACHE_SIZE:
+            self._hyde_cache.popitem(last=False)
+        return bundle
+
+    async def _aembed_texts(self, texts):
+        """Embed texts as concurrent fixed-size batches so HTTP/TLS setup and
+        the embedder's forward-pass fixed cost are amortized across the whole
+        ingest instead of paid per string."""
+        chunks = [
+            texts[i:i + self.EMBED_CHUNK_SIZE]
+            for i in range(0, len(texts), self.EMBED_CHUNK_SIZE)
+        ]
+        results = await asyncio.gather(
+            *[
+                self.embed_model.aget_text_embedding_batch(chunk, show_progress=True)
+                for chunk in chunks
+            ]
+        )
+        return [embedding for chunk in results for embedding in chunk]
+
+    def _build_lock_is_stale(self):
+        """A lock older than BUILD_LOCK_STALE_SECS means its holder died
+        without cleaning up; waiting on it would hang forever."""
+        try:
+            return time.time() - os.path.getmtime(self._build_lock_path) > self.BUILD_LOCK_STALE_SECS
+        except FileNotFoundError:
+            return False
+
+    def _acquire_build_lock(self):
+        """Grab the cross-process build lock; only the first worker to create
+        the lock file builds the index. Stale locks left by a killed holder
+        are broken rather than waited on."""
+        while True:
+            try:
+                fd = os.open(self._build_lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                self._holds_build_lock = True
+                return True
+            except FileExistsError:
+                if not self._build_lock_is_stale():
+                    return False
+                logger.warning("Breaking stale build lock; its holder appears to have died.")
+                try:
+                    os.remove(self._build_lock_path)
+                except FileNotFoundError:
+                    pass
+
+    def _release_build_lock(self):
+        if not getattr(self, "_holds_build_lock", False):
+            return
+        self._holds_build_lock = False
+        try:
+            os.remove(self._build_lock_path)
+        except FileNotFoundError:
+            pass
+
+    def _load_faiss_vector_store(self):
+        """Load the persisted FAISS index memory-mapped read-only so multiple
+        uvicorn workers share one resident copy instead of each holding its
+        own."""
+        faiss_path = os.path.join(self.persist_dir, "default__vector_store.json")
+        try:
+            faiss_index = faiss.read_index(
+                faiss_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+            return FaissVectorStore(faiss_index=faiss_index)
+        except Exception:
+            logger.warning("mmap load of FAISS index failed; falling back to in-memory load.")
+            return FaissVectorStore.from_persist_dir(self.persist_dir)
+
+    def _is_legacy_vector_store(self):
+        """The pre-FAISS SimpleVectorStore persisted JSON under the same
+        default__vector_store.json filename the FAISS binary now uses; such a
+        store (or a missing file) cannot be loaded and must be rebuilt."""
+        faiss_path = os.path.join(self.persist_dir, "default__vector_store.json")
+        if not os.path.exists(faiss_path):
+            return True
+        with open(faiss_path, 'rb') as f:
+            # A FAISS binary starts with a fourcc index tag, never with JSON
+            return f.read(1) == b'{'
+
+    def _load_manifest(self):
+        manifest_path = os.path.join(self.persist_dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def _persist_manifest(self, etags):
+        with open(os.path.join(self.persist_dir, "manifest.json"), 'w') as f:
+            json.dump(etags, f)
+
+    def _load_persisted_index(self, mmap=True):
+        if mmap:
+            vector_store = self._load_faiss_vector_store()
+        else:
+            vector_store = FaissVectorStore.from_persist_dir(self.persist_dir)
+        storage_context = StorageContext.from_defaults(
+            vector_store=vector_store, persist_dir=self.persist_dir
+        )
+        index = load_index_from_storage(storage_context)
+        self._load_binary_index()
+        return index
+
+    async def _parse_and_embed_nodes(self, documents):
+        """Parse documents into nodes, optionally enrich them with the LLM
+        extractors, and attach batched embeddings."""
+        # Markdown pre-split preserves header structure; the sentence parser
+        # then emits sentence-sized nodes whose "window" metadata the existing
+        # MetadataReplacementPostProcessor expands back at read time. Small
+        # nodes mean fewer tokens per embedding and tighter retrieval hits.
+        markdown_parser = MarkdownNodeParser()
+        node_parser = SentenceWindowNodeParser.from_defaults(
+            window_size=3,
+            window_metadata_key="window",
+            original_text_metadata_key="original_text",
+        )
+        section_nodes = markdown_parser.get_nodes_from_documents(documents)
+        self.nodes = node_parser.get_nodes_from_documents(section_nodes)
+        logger.debug("Nodes parsed from documents.")
+
+        # The extractors cost several LLM calls per node, dominating
+        # index build time, so they are opt-in via env var.
+        if os.getenv("ENABLE_METADATA_EXTRACTORS", "0") == "1":
+            extractors = [
+                SummaryExtractor(summaries=["self"], llm=self.llm, num_workers=4),
+                QuestionsAnsweredExtractor(questions=3, llm=self.llm, metadata_mode=MetadataMode.EMBED, num_workers=4),
+            ]
+
+            # Parallelize pipeline processing; nodes are already parsed, so the
+            # pipeline only runs the extractors.
+            pipeline = IngestionPipeline(transformations=[*extractors])
+            nodes1 = await pipeline.arun(nodes=self.nodes, in_place=False, show_progress=True)
+            all_nodes = self.nodes + nodes1
+        else:
+            logger.info("Metadata extractors disabled; indexing parsed nodes directly.")
+            all_nodes = self.nodes
+        embeddings = await self._aembed_texts(
+            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in all_nodes]
+        )
+        for node, embedding in zip(all_nodes, embeddings):
+            node.embedding = embedding
+        return all_nodes, embeddings
+
+    async def _insert_new_blobs(self, index, enhancer, new_blobs, current_etags):
+        """Delta-ingest blobs that appeared since the last build, instead of
+        rebuilding the whole index."""
+        documents = await enhancer.aload_and_enhance_documents(blob_names=set(new_blobs))
+        all_nodes, embeddings = await self._parse_and_embed_nodes(documents)
+        index.insert_nodes(all_nodes)
+        self._build_binary_index(
+            list(self.rerank_node_ids or []) + [node.node_id for node in all_nodes],
+            np.vstack([self.rerank_embeddings, np.asarray(embeddings, dtype=np.float32)])
+            if self.rerank_embeddings is not None
+            else embeddings,
+        )
+        index.storage_context.persist(persist_dir=self.persist_dir)
+        self._persist_binary_index()
+        self._persist_manifest(current_etags)
+        logger.info(f"Inserted {len(all_nodes)} nodes from {len(new_blobs)} new blob(s).")
+
+    async def _initialize_index(self):
+        try:
+            enhancer = DocumentEnhancer(self.connection_string, self.container_name)
+            has_store = os.path.exists(self.persist_dir) and os.listdir(self.persist_dir)
+            if has_store and self._is_legacy_vector_store():
+                logger.info("Persisted store predates the FAISS backend; rebuilding index...")
+                has_store = False
+            if has_store:
+                manifest = self._load_manifest()
+                if not manifest:
+                    # FAISS-format store without a manifest; load it as-is.
+                    logger.info("Loading existing index...")
+                    return self._load_persisted_index()
+                current_etags = await enhancer.alist_blob_etags()
+                stale = [name for name, etag in manifest.items() if current_etags.get(name) != etag]
+                new = [name for name in current_etags if name not in manifest]
+                if not stale and not new:
+                    logger.info("Loading existing index (blob etags unchanged)...")
+                    return self._load_persisted_index()
+                if not stale:
+                    # Mutating and re-persisting the store needs the same
+                    # cross-process lock as a full build, or workers race on
+                    # the persisted files and duplicate the ingest.
+                    if not self._acquire_build_lock():
+                        logger.info("Waiting for another worker to finish updating the index...")
+                        while os.path.exists(self._build_lock_path) and not self._build_lock_is_stale():
+                            await asyncio.sleep(1)
+                        return await self._initialize_index()
+                    logger.info(f"Ingesting {len(new)} new blob(s) into the existing index...")
+                    index = self._load_persisted_index(mmap=False)
+                    await self._insert_new_blobs(index, enhancer, new, current_etags)
+                    return index
+                # FAISS cannot delete vectors in place, so changed or removed
+                # blobs force a rebuild from scratch.
+                logger.info(f"{len(stale)} blob(s) changed or removed; rebuilding index...")
+            if not self._acquire_build_lock():
+                # Another worker got here first; wait for its build to land,
+                # then load the persisted index instead of duplicating the work.
+                logger.info("Waiting for another worker to finish building the index...")
+                while os.path.exists(self._build_lock_path) and not self._build_lock_is_stale():
+                    await asyncio.sleep(1)
+                return await self._initialize_index()
+
+            logger.info("Creating a new index from documents...")
+            # local_directory = "docs"  # Replace with your directory containing documents
+            current_etags = await enhancer.alist_blob_etags()
+            # DocumentEnhancer already returns combined Document objects
+            documents = await enhancer.aload_and_enhance_documents()
+            logger.debug("Documents loaded and enhanced.")
+
+            all_nodes, embeddings = await self._parse_and_embed_nodes(documents)
+
+            # Create and save the index
+            vector_store = FaissVectorStore(faiss_index=self._build_faiss_index(embeddings))
+            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+            index = VectorStoreIndex(all_nodes, storage_context=storage_context, use_async=True)
+            self._build_binary_index([node.node_id for node in all_nodes], embeddings)
+            logger.info("Index created and nodes ingested.")
+
+            index.storage_context.persist(persist_dir=self.persist_dir)
+            self._persist_binary_index()
+            self._persist_manifest(current_etags)
+            logger.debug("Index persisted to storage.")
+            return index
+        except Exception as e:
+            # Surface the real failure to create() so startup aborts with the
+            # root cause instead of limping on with index=None.
+            logger.error(f"Error initializing index: {e}", exc_info=True)
+            raise
+        finally:
+            self._release_build_lock()
+
+    def _build_chat_engine(self):
+        """Build the chat engine once; every query reuses it, keeping the
+        prompt and retriever objects warm instead of reallocating per call."""
+        faiss_index = getattr(self.index.vector_store, "client", None)
+        if hasattr(faiss_index, "nprobe"):
+            faiss_index.nprobe = 8
+
+        if self.binary_index is not None:
+            retriever = HammingRerankRetriever(
+                docstore=self.index.docstore,
+                binary_index=self.binary_index,
+                node_ids=self.rerank_node_ids,
+                embeddings=self.rerank_embeddings,
+                embed_model=self.embed_model,
+                hyde_fn=self._hyde_query_bundle,
+                similarity_top_k=4,
+            )
+            return ContextChatEngine.from_defaults(
+                retriever=retriever,
+                llm=self.llm,
+                node_postprocessors=[self.postproc],
+                memory=self.memory,
+                system_prompt=SYSTEM_PROMPT,
+            )
+        return self.index.as_chat_engine(
+            similarity_top_k=4,
+            query_transform=self.hyde_transformer,
+            node_postprocessors=[self.postproc],
+            memory=self.memory,
+            chat_mode="context",
+            system_prompt=SYSTEM_PROMPT,
+        )
+
+    def query_document_tool(self, query: str):
+        try:
+            logger.debug(f"Received query: {query}")
+            response = self.engine.chat(query)
+            logger.info("Query processed successfully.")
+            return response
+        except Exception as e:
+            logger.error(f"Error processing query: {e}", exc_info=True)
+
+    async def aquery_document_tool(self, query: str):
+        """Async variant of query_document_tool; concurrent requests overlap
+        their LLM/embedding network I/O instead of serializing on one call."""
+        try:
+            logger.debug(f"Received query: {query}")
+            response = await self.engine.achat(query)
             logger.info("Query processed successfully.")
             return response
         except Exception as e:
             logger.error(f"Error processing query: {e}", exc_info=True)
+
+
+_tools_instance = None
+_tools_lock = asyncio.Lock()
+
+
+async def get_tools() -> Tools:
+    """Process-wide Tools singleton. Construction is expensive (models, index
+    build/load), so it happens at most once, guarded against concurrent
+    callers during startup."""
+    global _tools_instance
+    async with _tools_lock:
+        if _tools_instance is None:
+            _tools_instance = await Tools.create()
+    return _tools_instance
@@ -3,36 +3,54 @@ import collections.abc
 import sys
 sys.modules['collections.Sequence'] = collections.abc.Sequence
 
+import os
+import asyncio
 import logging
-from flask import Flask, request, jsonify
-from dataclasses import dataclass
-from routes.chatengine import Tools
-from flask_cors import CORS
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
 
-# Initialize Flask app
-app = Flask(__name__)
+# Load environment variables exactly once at process entry, before any
+# service modules read them.
+load_dotenv(override=False)
+
+from routes.chatengine import get_tools
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build or load the index at startup rather than import time; a file lock
+    # inside Tools ensures only one worker builds while the rest mmap the
+    # persisted FAISS index read-only.
+    app.state.tools = await get_tools()
+    yield
+
+# Initialize FastAPI app
+# orjson serializes the multi-KB markdown/emoji responses in C instead of
+# stdlib json
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add CORS middleware
-CORS(app, resources={
-    r"/*": {
-        "origins": "*",
-        "allow_credentials": True,
-        "methods": ["*"],
-        "headers": ["*"]
-    }
-})
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 # Define the input and output models
-@dataclass
-class QueryRequest:
+class QueryRequest(BaseModel):
     query: str
 
-@dataclass
-class QueryResponse:
+class QueryResponse(BaseModel):
     response: str
 
-# Initialize the Tools instance
-tools = Tools()
+# Cap concurrent chat calls so a burst of users overlaps I/O without
+# overwhelming the LLM endpoint; tune via env var per deployment.
+query_semaphore = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_QUERIES", "8")))
 
 # Logger setup
 logger = logging.getLogger("run.py")
@@ -41,8 +59,8 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-@app.route("/start-chat", methods=['GET'])
-def start_chat():
+@app.get("/start-chat")
+async def start_chat():
     """
     Endpoint to display the intro message when accessed
     """
@@ -51,37 +69,38 @@ def start_chat():
     I'm happy to chat and assist you, but please note that my responses are powered by OpenAI.
     Let's work together to find the information you need. Feel free to ask me about documents, policies, or government procedures.
     """
-    return jsonify({"message": intro_message})
+    return {"message": intro_message}
 
-@app.route("/query", methods=['POST'])
-def query_endpoint():
+@app.post("/query", response_model=QueryResponse)
+async def query_endpoint(payload: QueryRequest, request: Request):
     """
-    Flask endpoint to handle chatbot queries.
+    FastAPI endpoint to handle chatbot queries.
     """
     try:
-        request_data = request.get_json()
-        query = request_data.get('query')
-        
-        if not query:
-            return jsonify({"error": "Query field is required"}), 400
-            
-        logger.info(f"Received query: {query}")
-        agent_response = tools.query_document_tool(query)
-        
+        if not payload.query:
+            raise HTTPException(status_code=400, detail="Query field is required")
+
+        logger.info(f"Received query: {payload.query}")
+        async with query_semaphore:
+            agent_response = await request.app.state.tools.aquery_document_tool(payload.query)
+
         # Extract the actual string response from AgentChatResponse
         response_text = agent_response.response
-        return jsonify(QueryResponse(response=response_text).__dict__)
+        return QueryResponse(response=response_text)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.route("/", methods=['GET'])
-def root():
+@app.get("/")
+async def root():
     """
     Root endpoint to verify service is running.
     """
-    return jsonify({"message": "Chatbot service is running. Use the /query endpoint to interact."})
+    return {"message": "Chatbot service is running. Use the /query endpoint to interact."}
 
 # This is only used when running locally
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000)
\ No newline at end of file
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
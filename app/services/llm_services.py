@@ -6,9 +6,8 @@ from llama_index.llms.azure_openai import AzureOpenAI
 from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 from llama_index.llms.bedrock import Bedrock
 from llama_index.core import Settings
-from dotenv import load_dotenv
 
-load_dotenv(override=True)
+# .env is loaded once at process start (run.py)
 os.environ['AWS_DEFAULT_REGION'] = 'ap-south-1'
 
 
@@ -19,12 +18,19 @@ class LLMService:
             self.config = json.load(f)
         self.llm = None
         self.initialize_llm()
+        # Optional reduced-dimension embeddings (text-embedding-3-*): smaller
+        # vectors halve bandwidth through FAISS at a minor recall cost.
+        embed_kwargs = {}
+        if self.config.get('embedding_dimensions'):
+            embed_kwargs['dimensions'] = self.config['embedding_dimensions']
         self.embed_model = AzureOpenAIEmbedding(
             model=self.config.get('embedding_model', 'text-embedding-ada-002'),
             deployment_name=self.config.get('embedding_deployment', 'text-embedding-ada-002'),
             api_key=os.getenv('AZURE_OPENAI_API_KEY'),
             azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
-            api_version=os.getenv('AZURE_OPENAI_API_VERSION')
+            api_version=os.getenv('AZURE_OPENAI_API_VERSION'),
+            embed_batch_size=self.config.get('embedding_batch_size', 256),
+            **embed_kwargs
         )
         Settings.embed_model = self.embed_model
 